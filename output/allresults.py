@@ -6,7 +6,6 @@ matplotlib.use('Agg')
 # import h5py as h5
 import numpy as np
 import pylab as plt
-from random import sample, seed
 from os.path import getsize as getFileSize
 
 # ================================================================================
@@ -68,6 +67,10 @@ class Results:
           print "Please pick a valid simulation!"
           exit(1)
 
+        self.DerivedFrom = None  # catalogue the cached StellarMassAndSFR arrays belong to
+        self.BaryonicMassFrom = None  # catalogue the cached BaryonicMass array belongs to
+        self.CentralFrom = None  # catalogue the cached IsCentral mask belongs to
+
 
 
     def read_gals(self, model_name, first_file, last_file):
@@ -186,10 +189,10 @@ class Results:
             FileIndexRanges.append((offset,offset+NtotGals))
         
             # Slice the file array into the global array
-            # N.B. the copy() part is required otherwise we simply point to
-            # the GG data which changes from file to file
+            # N.B. slice assignment copies the records into G, so GG can be
+            # reused for the next file without an extra copy()
             # NOTE THE WAY PYTHON WORKS WITH THESE INDICES!
-            G[offset:offset+NtotGals]=GG[0:NtotGals].copy()
+            G[offset:offset+NtotGals]=GG[0:NtotGals]
             
             del(GG)
             offset = offset + NtotGals  # Update the offset position for the global array
@@ -213,40 +216,83 @@ class Results:
 
         return G
 
+
+    def StellarMassAndSFR(self, G):
+        """Return the stellar mass (Msun) and total SFR of every galaxy in G.
+        These are computed once per catalogue and shared between plots."""
+
+        if self.DerivedFrom is not G:
+            self.StellarMassPhys = G.StellarMass * 1.0e10 / self.Hubble_h
+            self.SFR = G.SfrDisk + G.SfrBulge
+            self.DerivedFrom = G
+
+        return self.StellarMassPhys, self.SFR
+
+
+    def BaryonicMass(self, G):
+        """Return the stellar plus cold gas mass (1e10 Msun/h) of every galaxy in G.
+        This is computed once per catalogue and shared between plots."""
+
+        if self.BaryonicMassFrom is not G:
+            self.ColdBaryons = G.StellarMass + G.ColdGas
+            self.BaryonicMassFrom = G
+
+        return self.ColdBaryons
+
+
+    def IsCentral(self, G):
+        """Return a boolean mask of the central (Type 0) galaxies in G.
+        This is computed once per catalogue and shared between plots."""
+
+        if self.CentralFrom is not G:
+            self.Central = (G.Type == 0)
+            self.CentralFrom = G
+
+        return self.Central
+
 # --------------------------------------------------------
 
     def StellarMassFunction(self, G):
 
         print 'Plotting the stellar mass function'
 
+        # calculate all
+        w = np.where(G.StellarMass > 0.0)[0]
+        if len(w) == 0:
+            print 'No galaxies with stellar mass, skipping this plot'
+            return
+
         plt.figure()  # New figure
         ax = plt.subplot(111)  # 1 plot on the figure
 
         binwidth = 0.1  # mass function histogram bin width
 
-        # calculate all
-        w = np.where(G.StellarMass > 0.0)[0]
-        mass = np.log10(G.StellarMass[w] * 1.0e10 / self.Hubble_h)
-        sSFR = (G.SfrDisk[w] + G.SfrBulge[w]) / (G.StellarMass[w] * 1.0e10 / self.Hubble_h)
+        AllStellarMassPhys, AllSFR = self.StellarMassAndSFR(G)
+        StellarMassPhys = AllStellarMassPhys[w]
+        mass = np.log10(StellarMassPhys)
+        sSFR = AllSFR[w]
+        sSFR /= StellarMassPhys
 
-        mi = np.floor(min(mass)) - 2
-        ma = np.floor(max(mass)) + 2
+        mi = np.floor(mass.min()) - 2
+        ma = np.floor(mass.max()) + 2
         NB = int((ma - mi) / binwidth)
+        norm = self.Hubble_h*self.Hubble_h*self.Hubble_h / (self.volume * binwidth)  # counts -> Mpc^-3 dex^-1
 
-        (counts, binedges) = np.histogram(mass, range=(mi, ma), bins=NB)
+        # The bins are uniform and cover every galaxy, so work out each bin index
+        # once and count all, red and blue galaxies from it with bincount
+        BinIndex = np.minimum(((mass - mi) / binwidth).astype(np.intp), NB - 1)
 
-        # Set the x-axis values to be the centre of the bins
-        xaxeshisto = binedges[:-1] + 0.5 * binwidth
-        
-        # additionally calculate red
-        w = np.where(sSFR < 10.0**sSFRcut)[0]
-        massRED = mass[w]
-        (countsRED, binedges) = np.histogram(massRED, range=(mi, ma), bins=NB)
+        # Tag galaxies as 1 = blue, 2 = red (0 = exactly on the cut) and count
+        # every (bin, colour) pair in a single pass
+        sSFRthresh = 10.0**sSFRcut
+        Colour = (sSFR > sSFRthresh) + 2 * (sSFR < sSFRthresh)
+        CountsByColour = np.bincount(3 * BinIndex + Colour, minlength=3 * NB).reshape(NB, 3)
+        counts = CountsByColour.sum(axis=1)
+        countsBLU = CountsByColour[:, 1]
+        countsRED = CountsByColour[:, 2]
 
-        # additionally calculate blue
-        w = np.where(sSFR > 10.0**sSFRcut)[0]
-        massBLU = mass[w]
-        (countsBLU, binedges) = np.histogram(massBLU, range=(mi, ma), bins=NB)
+        # Set the x-axis values to be the centre of the bins
+        xaxeshisto = mi + (np.arange(NB) + 0.5) * binwidth
 
         # Baldry+ 2008 modified data used for the MCMC fitting
         Baldry = np.array([
@@ -313,7 +359,7 @@ class Results:
         #     label='Baldry et al. 2008',
         #     )
 
-        Baldry_xval = np.log10(10 ** Baldry[:, 0]  /self.Hubble_h/self.Hubble_h)
+        Baldry_xval = Baldry[:, 0] - 2.0*np.log10(self.Hubble_h)
         if(whichimf == 1):  Baldry_xval = Baldry_xval - 0.26  # convert back to Chabrier IMF
         Baldry_yvalU = (Baldry[:, 1]+Baldry[:, 2]) * self.Hubble_h*self.Hubble_h*self.Hubble_h
         Baldry_yvalL = (Baldry[:, 1]-Baldry[:, 2]) * self.Hubble_h*self.Hubble_h*self.Hubble_h
@@ -322,7 +368,7 @@ class Results:
             facecolor='purple', alpha=0.25, label='Baldry et al. 2008 (z=0.1)')
 
         # This next line is just to get the shaded region to appear correctly in the legend
-        plt.plot(xaxeshisto, counts / self.volume * self.Hubble_h*self.Hubble_h*self.Hubble_h / binwidth, label='Baldry et al. 2008', color='purple', alpha=0.3)
+        plt.plot(xaxeshisto, counts * norm, label='Baldry et al. 2008', color='purple', alpha=0.3)
 
         # # Cole et al. 2001 SMF (h=1.0 converted to h=0.73)
         # M = np.arange(7.0, 13.0, 0.01)
@@ -334,9 +380,9 @@ class Results:
         # plt.plot(M, yval, 'g--', lw=1.5, label='Cole et al. 2001')  # Plot the SMF
         
         # Overplot the model histograms
-        plt.plot(xaxeshisto, counts    / self.volume * self.Hubble_h*self.Hubble_h*self.Hubble_h / binwidth, 'k-', label='Model - All')
-        plt.plot(xaxeshisto, countsRED / self.volume * self.Hubble_h*self.Hubble_h*self.Hubble_h / binwidth, 'r:', lw=2, label='Model - Red')
-        plt.plot(xaxeshisto, countsBLU / self.volume * self.Hubble_h*self.Hubble_h*self.Hubble_h / binwidth, 'b:', lw=2, label='Model - Blue')
+        plt.plot(xaxeshisto, counts * norm, 'k-', label='Model - All')
+        plt.plot(xaxeshisto, countsRED * norm, 'r:', lw=2, label='Model - Red')
+        plt.plot(xaxeshisto, countsBLU * norm, 'b:', lw=2, label='Model - Blue')
 
         plt.yscale('log', nonposy='clip')
         plt.axis([8.0, 12.5, 1.0e-6, 1.0e-1])
@@ -376,12 +422,15 @@ class Results:
         binwidth = 0.1  # mass function histogram bin width
       
         # calculate BMF
-        w = np.where(G.StellarMass + G.ColdGas > 0.0)[0]
-        mass = np.log10((G.StellarMass[w] + G.ColdGas[w]) * 1.0e10 / self.Hubble_h)
+        BaryonicMass = self.BaryonicMass(G)
+        mass = BaryonicMass[BaryonicMass > 0.0] * 1.0e10
+        mass /= self.Hubble_h
+        np.log10(mass, out=mass)
 
-        mi = np.floor(min(mass)) - 2
-        ma = np.floor(max(mass)) + 2
+        mi = np.floor(mass.min()) - 2
+        ma = np.floor(mass.max()) + 2
         NB = int((ma - mi) / binwidth)
+        norm = self.Hubble_h*self.Hubble_h*self.Hubble_h / (self.volume * binwidth)  # counts -> Mpc^-3 dex^-1
 
         (counts, binedges) = np.histogram(mass, range=(mi, ma), bins=NB)
 
@@ -393,18 +442,22 @@ class Results:
         Mstar = np.log10(5.3*1.0e10 /self.Hubble_h/self.Hubble_h)
         alpha = -1.21
         phistar = 0.0108 *self.Hubble_h*self.Hubble_h*self.Hubble_h
-        xval = 10.0 ** (M-Mstar)
-        yval = np.log(10.) * phistar * xval ** (alpha+1) * np.exp(-xval)
+        # Schechter function, evaluated in place to avoid a temporary per term
+        xval = M - Mstar
+        np.power(10.0, xval, out=xval)
+        yval = np.exp(-xval)
+        yval *= xval ** (alpha+1)
+        yval *= np.log(10.) * phistar
         
         if(whichimf == 0):
             # converted diet Salpeter IMF to Salpeter IMF
-            plt.plot(np.log10(10.0**M /0.7), yval, 'b-', lw=2.0, label='Bell et al. 2003')  # Plot the SMF
+            plt.plot(M - np.log10(0.7), yval, 'b-', lw=2.0, label='Bell et al. 2003')  # Plot the SMF
         elif(whichimf == 1):
             # converted diet Salpeter IMF to Salpeter IMF, then to Chabrier IMF
-            plt.plot(np.log10(10.0**M /0.7 /1.8), yval, 'g--', lw=1.5, label='Bell et al. 2003')  # Plot the SMF
+            plt.plot(M - np.log10(0.7*1.8), yval, 'g--', lw=1.5, label='Bell et al. 2003')  # Plot the SMF
 
         # Overplot the model histograms
-        plt.plot(xaxeshisto, counts / self.volume * self.Hubble_h*self.Hubble_h*self.Hubble_h / binwidth, 'k-', label='Model')
+        plt.plot(xaxeshisto, counts * norm, 'k-', label='Model')
 
         plt.yscale('log', nonposy='clip')
         plt.axis([8.0, 12.5, 1.0e-6, 1.0e-1])
@@ -436,33 +489,26 @@ class Results:
 
         print 'Plotting the cold gas mass function'
 
+        # calculate all
+        w = np.where(G.ColdGas > 0.0)[0]
+        if len(w) == 0:
+            print 'No galaxies with cold gas, skipping this plot'
+            return
+
         plt.figure()  # New figure
         ax = plt.subplot(111)  # 1 plot on the figure
 
         binwidth = 0.1  # mass function histogram bin width
 
-        # calculate all
-        w = np.where(G.ColdGas > 0.0)[0]
         mass = np.log10(G.ColdGas[w] * 1.0e10 / self.Hubble_h)
-        sSFR = (G.SfrDisk[w] + G.SfrBulge[w]) / (G.StellarMass[w] * 1.0e10 / self.Hubble_h)
-        mi = np.floor(min(mass)) - 2
-        ma = np.floor(max(mass)) + 2
+        mi = np.floor(mass.min()) - 2
+        ma = np.floor(mass.max()) + 2
         NB = int((ma - mi) / binwidth)
 
         (counts, binedges) = np.histogram(mass, range=(mi, ma), bins=NB)
 
         # Set the x-axis values to be the centre of the bins
         xaxeshisto = binedges[:-1] + 0.5 * binwidth
-        
-        # additionally calculate red
-        w = np.where(sSFR < 10.0**sSFRcut)[0]
-        massRED = mass[w]
-        (countsRED, binedges) = np.histogram(massRED, range=(mi, ma), bins=NB)
-
-        # additionally calculate blue
-        w = np.where(sSFR > 10.0**sSFRcut)[0]
-        massBLU = mass[w]
-        (countsBLU, binedges) = np.histogram(massBLU, range=(mi, ma), bins=NB)
 
         # Baldry+ 2008 modified data used for the MCMC fitting
         Zwaan = np.array([[6.933,   -0.333],
@@ -565,20 +611,22 @@ class Results:
     
         print 'Plotting the baryonic TF relationship'
     
-        seed(2222)
+        rng = np.random.RandomState(2222)
     
         plt.figure()  # New figure
         ax = plt.subplot(111)  # 1 plot on the figure
     
         # w = np.where((G.Type == 0) & (G.StellarMass + G.ColdGas > 0.0) & (G.Vmax > 0.0))[0]
-        w = np.where((G.Type == 0) & (G.StellarMass + G.ColdGas > 0.0) & 
-          (G.BulgeMass / G.StellarMass > 0.1) & (G.BulgeMass / G.StellarMass < 0.5))[0]
-        if(len(w) > dilute): w = sample(w, dilute)
+        BaryonicMass = self.BaryonicMass(G)
+        # Sb/c bulge-to-total cut, multiplied out so StellarMass = 0 never divides
+        w = np.where(self.IsCentral(G) & (BaryonicMass > 0.0) & 
+          (G.BulgeMass > 0.1 * G.StellarMass) & (G.BulgeMass < 0.5 * G.StellarMass))[0]
+        if(len(w) > dilute): w = rng.choice(w, dilute, replace=False)
     
-        mass = np.log10((G.StellarMass[w] + G.ColdGas[w]) * 1.0e10 / self.Hubble_h)
+        mass = np.log10(BaryonicMass[w] * 1.0e10 / self.Hubble_h)
         vel = np.log10(G.Vmax[w])
                     
-        plt.scatter(vel, mass, marker='o', s=1, c='k', alpha=0.5, label='Model Sb/c galaxies')
+        plt.scatter(vel, mass, marker='o', s=1, c='k', alpha=0.5, rasterized=True, label='Model Sb/c galaxies')
                 
         # overplot Stark, McGaugh & Swatters 2009 (assumes h=0.75? ... what IMF?)
         w = np.arange(0.5, 10.0, 0.5)
@@ -614,17 +662,28 @@ class Results:
     
         print 'Plotting the specific SFR'
     
-        seed(2222)
-    
+        rng = np.random.RandomState(2222)
+
+        w = np.where(G.StellarMass > 0.01)[0]
+        if len(w) == 0:
+            print 'No galaxies with stellar mass, skipping this plot'
+            return
+
         plt.figure()  # New figure
         ax = plt.subplot(111)  # 1 plot on the figure
 
-        w = np.where(G.StellarMass > 0.01)[0]
-        if(len(w) > dilute): w = sample(w, dilute)
+        if(len(w) > dilute): w = rng.choice(w, dilute, replace=False)
         
-        mass = np.log10(G.StellarMass[w] * 1.0e10 / self.Hubble_h)
-        sSFR = np.log10( (G.SfrDisk[w] + G.SfrBulge[w]) / (G.StellarMass[w] * 1.0e10 / self.Hubble_h) )
-        plt.scatter(mass, sSFR, marker='o', s=1, c='k', alpha=0.5, label='Model galaxies')
+        AllStellarMassPhys, AllSFR = self.StellarMassAndSFR(G)
+        StellarMassPhys = AllStellarMassPhys[w]
+        mass = np.log10(StellarMassPhys)
+        SFR = AllSFR[w]
+        HasSFR = SFR > 0.0
+        # Passive galaxies keep log10(0) = -inf and drop off the plot
+        sSFR = np.full_like(StellarMassPhys, -np.inf)
+        np.divide(SFR, StellarMassPhys, out=sSFR, where=HasSFR)
+        np.log10(sSFR, out=sSFR, where=HasSFR)
+        plt.plot(mass, sSFR, 'ko', markersize=1, markeredgewidth=0, alpha=0.5, rasterized=True, label='Model galaxies')
                 
         # overplot dividing line between SF and passive
         w = np.arange(7.0, 13.0, 1.0)
@@ -659,19 +718,21 @@ class Results:
     
         print 'Plotting the gas fractions'
     
-        seed(2222)
+        rng = np.random.RandomState(2222)
     
         plt.figure()  # New figure
         ax = plt.subplot(111)  # 1 plot on the figure
 
-        w = np.where((G.Type == 0) & (G.StellarMass + G.ColdGas > 0.0) & 
-          (G.BulgeMass / G.StellarMass > 0.1) & (G.BulgeMass / G.StellarMass < 0.5))[0]
-        if(len(w) > dilute): w = sample(w, dilute)
+        BaryonicMass = self.BaryonicMass(G)
+        # Sb/c bulge-to-total cut, multiplied out so StellarMass = 0 never divides
+        w = np.where(self.IsCentral(G) & (BaryonicMass > 0.0) & 
+          (G.BulgeMass > 0.1 * G.StellarMass) & (G.BulgeMass < 0.5 * G.StellarMass))[0]
+        if(len(w) > dilute): w = rng.choice(w, dilute, replace=False)
         
-        mass = np.log10(G.StellarMass[w] * 1.0e10 / self.Hubble_h)
-        fraction = G.ColdGas[w] / (G.StellarMass[w] + G.ColdGas[w])
+        mass = np.log10(self.StellarMassAndSFR(G)[0][w])
+        fraction = G.ColdGas[w] / BaryonicMass[w]
                     
-        plt.scatter(mass, fraction, marker='o', s=1, c='k', alpha=0.5, label='Model Sb/c galaxies')
+        plt.scatter(mass, fraction, marker='o', s=1, c='k', alpha=0.5, rasterized=True, label='Model Sb/c galaxies')
             
         plt.ylabel(r'$\mathrm{Cold\ Mass\ /\ (Cold+Stellar\ Mass)}$')  # Set the y...
         plt.xlabel(r'$\log_{10} M_{\mathrm{stars}}\ (M_{\odot})$')  # and the x-axis labels
@@ -702,28 +763,32 @@ class Results:
     
         print 'Plotting the metallicities'
     
-        seed(2222)
+        rng = np.random.RandomState(2222)
     
         plt.figure()  # New figure
         ax = plt.subplot(111)  # 1 plot on the figure
 
-        w = np.where((G.Type == 0) & (G.ColdGas / (G.StellarMass + G.ColdGas) > 0.1) & (G.StellarMass > 0.01))[0]
-        if(len(w) > dilute): w = sample(w, dilute)
+        # Cold gas fraction above 0.1, multiplied out so no division is needed
+        w = np.where(self.IsCentral(G) & (G.ColdGas > 0.1 * self.BaryonicMass(G)) & (G.StellarMass > 0.01))[0]
+        if(len(w) > dilute): w = rng.choice(w, dilute, replace=False)
         
-        mass = np.log10(G.StellarMass[w] * 1.0e10 / self.Hubble_h)
-        Z = np.log10((G.MetalsColdGas[w] / G.ColdGas[w]) / 0.02) + 9.0
+        mass = np.log10(self.StellarMassAndSFR(G)[0][w])
+        Z = G.MetalsColdGas[w] / G.ColdGas[w]
+        Z /= 0.02
+        np.log10(Z, out=Z)
+        Z += 9.0
                     
-        plt.scatter(mass, Z, marker='o', s=1, c='k', alpha=0.5, label='Model galaxies')
+        plt.scatter(mass, Z, marker='o', s=1, c='k', alpha=0.5, rasterized=True, label='Model galaxies')
             
         # overplot Tremonti et al. 2003 (h=0.7)
         w = np.arange(7.0, 13.0, 0.1)
         Zobs = -1.492 + 1.847*w - 0.08026*w*w
         if(whichimf == 0):
             # Conversion from Kroupa IMF to Slapeter IMF
-            plt.plot(np.log10((10**w *1.5)), Zobs, 'b-', lw=2.0, label='Tremonti et al. 2003')
+            plt.plot(w + np.log10(1.5), Zobs, 'b-', lw=2.0, label='Tremonti et al. 2003')
         elif(whichimf == 1):
             # Conversion from Kroupa IMF to Slapeter IMF to Chabrier IMF
-            plt.plot(np.log10((10**w *1.5 /1.8)), Zobs, 'b-', lw=2.0, label='Tremonti et al. 2003')
+            plt.plot(w + np.log10(1.5 /1.8), Zobs, 'b-', lw=2.0, label='Tremonti et al. 2003')
             
         plt.ylabel(r'$12\ +\ \log_{10}[\mathrm{O/H}]$')  # Set the y...
         plt.xlabel(r'$\log_{10} M_{\mathrm{stars}}\ (M_{\odot})$')  # and the x-axis labels
@@ -754,23 +819,23 @@ class Results:
     
         print 'Plotting the black hole-bulge relationship'
     
-        seed(2222)
+        rng = np.random.RandomState(2222)
     
         plt.figure()  # New figure
         ax = plt.subplot(111)  # 1 plot on the figure
     
         w = np.where((G.BulgeMass > 0.01) & (G.BlackHoleMass > 0.00001))[0]
-        if(len(w) > dilute): w = sample(w, dilute)
+        if(len(w) > dilute): w = rng.choice(w, dilute, replace=False)
     
         bh = np.log10(G.BlackHoleMass[w] * 1.0e10 / self.Hubble_h)
         bulge = np.log10(G.BulgeMass[w] * 1.0e10 / self.Hubble_h)
                     
-        plt.scatter(bulge, bh, marker='o', s=1, c='k', alpha=0.5, label='Model galaxies')
+        plt.scatter(bulge, bh, marker='o', s=1, c='k', alpha=0.5, rasterized=True, label='Model galaxies')
                 
         # overplot Haring & Rix 2004
-        w = 10. ** np.arange(20)
-        BHdata = 10. ** (8.2 + 1.12 * np.log10(w / 1.0e11))
-        plt.plot(np.log10(w), np.log10(BHdata), 'b-', label="Haring \& Rix 2004")
+        w = np.arange(20.0)  # log10 bulge mass
+        BHdata = 8.2 + 1.12 * (w - 11.0)  # log10 black hole mass
+        plt.plot(w, BHdata, 'b-', label="Haring \& Rix 2004")
 
         plt.ylabel(r'$\log\ M_{\mathrm{BH}}\ (M_{\odot})$')  # Set the y...
         plt.xlabel(r'$\log\ M_{\mathrm{bulge}}\ (M_{\odot})$')  # and the x-axis labels
@@ -801,18 +866,22 @@ class Results:
     
         print 'Plotting the quiescent fraction vs stellar mass'
     
-        seed(2222)
-    
+        w = np.where(G.StellarMass > 0.0)[0]
+        if len(w) == 0:
+            print 'No galaxies with stellar mass, skipping this plot'
+            return
+
         plt.figure()  # New figure
         ax = plt.subplot(111)  # 1 plot on the figure
         
         groupscale = 12.5
         
-        w = np.where(G.StellarMass > 0.0)[0]
-        StellarMass = np.log10(G.StellarMass[w] * 1.0e10 / self.Hubble_h)
+        AllStellarMassPhys, AllSFR = self.StellarMassAndSFR(G)
+        StellarMassPhys = AllStellarMassPhys[w]
+        StellarMass = np.log10(StellarMassPhys)
         CentralMvir = np.log10(G.CentralMvir[w] * 1.0e10 / self.Hubble_h)
         Type = G.Type[w]
-        sSFR = (G.SfrDisk[w] + G.SfrBulge[w]) / (G.StellarMass[w] * 1.0e10 / self.Hubble_h)
+        sSFR = AllSFR[w] / StellarMassPhys
 
         MinRange = 9.5
         MaxRange = 12.0
@@ -820,51 +889,31 @@ class Results:
         Nbins = int((MaxRange-MinRange)/Interval)
         Range = np.arange(MinRange, MaxRange, Interval)
         
-        Mass = []
-        Fraction = []
-        CentralFraction = []
-        SatelliteFraction = []
-        SatelliteFractionLo = []
-        SatelliteFractionHi = []
-
-        for i in xrange(Nbins-1):
-            
-            w = np.where((StellarMass >= Range[i]) & (StellarMass < Range[i+1]))[0]
-            if len(w) > 0:
-                wQ = np.where((StellarMass >= Range[i]) & (StellarMass < Range[i+1]) & (sSFR < 10.0**sSFRcut))[0]
-                Fraction.append(1.0*len(wQ) / len(w))
-            else:
-                Fraction.append(0.0)
-
-            w = np.where((Type == 0) & (StellarMass >= Range[i]) & (StellarMass < Range[i+1]))[0]
-            if len(w) > 0:
-                wQ = np.where((Type == 0) & (StellarMass >= Range[i]) & (StellarMass < Range[i+1]) & (sSFR < 10.0**sSFRcut))[0]
-                CentralFraction.append(1.0*len(wQ) / len(w))
-            else:
-                CentralFraction.append(0.0)
-
-            w = np.where((Type == 1) & (StellarMass >= Range[i]) & (StellarMass < Range[i+1]))[0]
-            if len(w) > 0:
-                wQ = np.where((Type == 1) & (StellarMass >= Range[i]) & (StellarMass < Range[i+1]) & (sSFR < 10.0**sSFRcut))[0]
-                SatelliteFraction.append(1.0*len(wQ) / len(w))
-                wQ = np.where((Type == 1) & (StellarMass >= Range[i]) & (StellarMass < Range[i+1]) & (sSFR < 10.0**sSFRcut) & (CentralMvir < groupscale))[0]
-                SatelliteFractionLo.append(1.0*len(wQ) / len(w))
-                wQ = np.where((Type == 1) & (StellarMass >= Range[i]) & (StellarMass < Range[i+1]) & (sSFR < 10.0**sSFRcut) & (CentralMvir > groupscale))[0]
-                SatelliteFractionHi.append(1.0*len(wQ) / len(w))                
-            else:
-                SatelliteFraction.append(0.0)
-                SatelliteFractionLo.append(0.0)
-                SatelliteFractionHi.append(0.0)
-                
-            Mass.append((Range[i] + Range[i+1]) / 2.0)                
-            # print '  ', Mass[i], Fraction[i], CentralFraction[i], SatelliteFraction[i]
-        
-        Mass = np.array(Mass)
-        Fraction = np.array(Fraction)
-        CentralFraction = np.array(CentralFraction)
-        SatelliteFraction = np.array(SatelliteFraction)
-        SatelliteFractionLo = np.array(SatelliteFractionLo)
-        SatelliteFractionHi = np.array(SatelliteFractionHi)
+        # The bins are uniform, so assign every galaxy its bin index once
+        # and count each population in a single pass with bincount
+        NumBins = Nbins - 1
+        BinIndex = np.floor((StellarMass - MinRange) / Interval).astype(np.intp)
+        InRange = (BinIndex >= 0) & (BinIndex < NumBins)
+        Quiescent = InRange & (sSFR < 10.0**sSFRcut)
+        Central = InRange & (Type == 0)
+        Satellite = InRange & (Type == 1)
+
+        NAll = np.bincount(BinIndex[InRange], minlength=NumBins)
+        NCentral = np.bincount(BinIndex[Central], minlength=NumBins)
+        NSatellite = np.bincount(BinIndex[Satellite], minlength=NumBins)
+        NAllQ = np.bincount(BinIndex[Quiescent], minlength=NumBins)
+        NCentralQ = np.bincount(BinIndex[Central & Quiescent], minlength=NumBins)
+        NSatelliteQ = np.bincount(BinIndex[Satellite & Quiescent], minlength=NumBins)
+        NSatelliteQLo = np.bincount(BinIndex[Satellite & Quiescent & (CentralMvir < groupscale)], minlength=NumBins)
+        NSatelliteQHi = np.bincount(BinIndex[Satellite & Quiescent & (CentralMvir > groupscale)], minlength=NumBins)
+
+        # Empty bins have no quiescent galaxies either, so they give a fraction of zero
+        Mass = (Range[:NumBins] + Range[1:NumBins+1]) / 2.0
+        Fraction = 1.0 * NAllQ / np.maximum(NAll, 1)
+        CentralFraction = 1.0 * NCentralQ / np.maximum(NCentral, 1)
+        SatelliteFraction = 1.0 * NSatelliteQ / np.maximum(NSatellite, 1)
+        SatelliteFractionLo = 1.0 * NSatelliteQLo / np.maximum(NSatellite, 1)
+        SatelliteFractionHi = 1.0 * NSatelliteQHi / np.maximum(NSatellite, 1)
         
         w = np.where(Fraction > 0)[0]
         plt.plot(Mass[w], Fraction[w], label='All')
@@ -910,12 +959,13 @@ class Results:
     
         print 'Plotting the mass fraction of galaxies'
     
-        seed(2222)
+        if not np.any(G.StellarMass > 0.0):
+            print 'No galaxies with stellar mass, skipping this plot'
+            return
 
+        StellarMassPhys = self.StellarMassAndSFR(G)[0]
         fBulge = G.BulgeMass / G.StellarMass
-        fDisk = 1.0 - (G.BulgeMass) / G.StellarMass
-        mass = np.log10(G.StellarMass * 1.0e10 / self.Hubble_h)
-        sSFR = np.log10((G.SfrDisk + G.SfrBulge) / (G.StellarMass * 1.0e10 / self.Hubble_h))
+        mass = np.log10(StellarMassPhys)
         
         binwidth = 0.2
         shift = binwidth/2.0
@@ -926,29 +976,29 @@ class Results:
         fBulge_var = np.zeros(bins)
         fDisk_ave = np.zeros(bins)
         fDisk_var = np.zeros(bins)
+
+        # The bins are uniform, so assign every galaxy its bin index once
+        bin_index = np.floor((mass - mass_range[0]) / binwidth).astype(np.intp)
         
         for i in xrange(bins-1):
-            w = np.where( (mass >= mass_range[i]) & (mass < mass_range[i+1]))[0]
+            w = np.where(bin_index == i)[0]
             # w = np.where( (mass >= mass_range[i]) & (mass < mass_range[i+1]) & (sSFR < sSFRcut))[0]
             if(len(w) > 0):
                 fBulge_ave[i] = np.mean(fBulge[w])
                 fBulge_var[i] = np.var(fBulge[w])
-                fDisk_ave[i] = np.mean(fDisk[w])
-                fDisk_var[i] = np.var(fDisk[w])
+                # fDisk = 1 - fBulge, so its moments follow without another pass
+                fDisk_ave[i] = 1.0 - fBulge_ave[i]
+                fDisk_var[i] = fBulge_var[i]
 
         w = np.where(fBulge_ave > 0.0)[0]
-        plt.plot(mass_range[w]+shift, fBulge_ave[w], 'r-', label='bulge')
-        plt.fill_between(mass_range[w]+shift, 
-            fBulge_ave[w]+fBulge_var[w], 
-            fBulge_ave[w]-fBulge_var[w], 
-            facecolor='red', alpha=0.25)
+        xval, ave, var = mass_range[w]+shift, fBulge_ave[w], fBulge_var[w]
+        plt.plot(xval, ave, 'r-', label='bulge')
+        plt.fill_between(xval, ave+var, ave-var, facecolor='red', alpha=0.25)
 
         w = np.where(fDisk_ave > 0.0)[0]
-        plt.plot(mass_range[w]+shift, fDisk_ave[w], 'k-', label='disk stars')
-        plt.fill_between(mass_range[w]+shift, 
-            fDisk_ave[w]+fDisk_var[w], 
-            fDisk_ave[w]-fDisk_var[w], 
-            facecolor='black', alpha=0.25)
+        xval, ave, var = mass_range[w]+shift, fDisk_ave[w], fDisk_var[w]
+        plt.plot(xval, ave, 'k-', label='disk stars')
+        plt.fill_between(xval, ave+var, ave-var, facecolor='black', alpha=0.25)
 
         plt.axis([mass_range[0], mass_range[bins-1], 0.0, 1.05])
 
@@ -975,78 +1025,78 @@ class Results:
     
         print 'Plotting the average baryon fraction vs halo mass'
     
-        seed(2222)
-    
+        # Only centrals are binned, so take their virial and halo mass once up front
+        Centrals = np.where(self.IsCentral(G) & (G.Mvir > 0.0))[0]
+        if len(Centrals) == 0:
+            print 'No central galaxies with a halo mass, skipping this plot'
+            return
+
         plt.figure()  # New figure
         ax = plt.subplot(111)  # 1 plot on the figure
         
-        HaloMass = np.log10(G.Mvir * 1.0e10 / self.Hubble_h)
+        CentralMvir = G.Mvir[Centrals]
+        HaloMass = np.log10(CentralMvir * 1.0e10 / self.Hubble_h)
         Baryons = G.StellarMass + G.ColdGas + G.HotGas + G.EjectedMass + G.IntraClusterStars + G.BlackHoleMass
 
+        # Sum each reservoir over every halo (central plus satellites) in one pass.
+        # CentralGalaxyIndex is sparse, so map it to compact halo ids first.
+        HaloIDs, Halo = np.unique(G.CentralGalaxyIndex, return_inverse=True)
+        NHalos = len(HaloIDs)
+        HaloBaryons = np.bincount(Halo, weights=Baryons, minlength=NHalos)
+        HaloStars = np.bincount(Halo, weights=G.StellarMass, minlength=NHalos)
+        HaloCold = np.bincount(Halo, weights=G.ColdGas, minlength=NHalos)
+        HaloHot = np.bincount(Halo, weights=G.HotGas, minlength=NHalos)
+        HaloEjected = np.bincount(Halo, weights=G.EjectedMass, minlength=NHalos)
+        HaloICS = np.bincount(Halo, weights=G.IntraClusterStars, minlength=NHalos)
+        HaloBH = np.bincount(Halo, weights=G.BlackHoleMass, minlength=NHalos)
+        CentralHaloID = Halo[Centrals]
+
         MinHalo = 11.0
         MaxHalo = 16.0
         Interval = 0.1
         Nbins = int((MaxHalo-MinHalo)/Interval)
         HaloRange = np.arange(MinHalo, MaxHalo, Interval)
         
-        MeanCentralHaloMass = []
-        MeanBaryonFraction = []
-        MeanBaryonFractionU = []
-        MeanBaryonFractionL = []
-
-        MeanStars = []
-        MeanCold = []
-        MeanHot = []
-        MeanEjected = []
-        MeanICS = []
-        MeanBH = []
-
-        for i in xrange(Nbins-1):
-            
-            w1 = np.where((G.Type == 0) & (HaloMass >= HaloRange[i]) & (HaloMass < HaloRange[i+1]))[0]
-            HalosFound = len(w1)
-            
-            if HalosFound > 2:  
-                
-                BaryonFraction = []
-                CentralHaloMass = []
-                
-                Stars = []
-                Cold = []
-                Hot = []
-                Ejected = []
-                ICS = []
-                BH = []
-                
-                for j in xrange(HalosFound):
-                    
-                    w2 = np.where(G.CentralGalaxyIndex == G.CentralGalaxyIndex[w1[j]])[0]
-                    CentralAndSatellitesFound = len(w2)
-                    
-                    if CentralAndSatellitesFound > 0:
-                        BaryonFraction.append(sum(Baryons[w2]) / G.Mvir[w1[j]])
-                        CentralHaloMass.append(np.log10(G.Mvir[w1[j]] * 1.0e10 / self.Hubble_h))
-
-                        Stars.append(sum(G.StellarMass[w2]) / G.Mvir[w1[j]])
-                        Cold.append(sum(G.ColdGas[w2]) / G.Mvir[w1[j]])
-                        Hot.append(sum(G.HotGas[w2]) / G.Mvir[w1[j]])
-                        Ejected.append(sum(G.EjectedMass[w2]) / G.Mvir[w1[j]])
-                        ICS.append(sum(G.IntraClusterStars[w2]) / G.Mvir[w1[j]])
-                        BH.append(sum(G.BlackHoleMass[w2]) / G.Mvir[w1[j]])                        
-                                
-                MeanCentralHaloMass.append(np.mean(CentralHaloMass))
-                MeanBaryonFraction.append(np.mean(BaryonFraction))
-                MeanBaryonFractionU.append(np.mean(BaryonFraction) + np.var(BaryonFraction))
-                MeanBaryonFractionL.append(np.mean(BaryonFraction) - np.var(BaryonFraction))
-                
-                MeanStars.append(np.mean(Stars))
-                MeanCold.append(np.mean(Cold))
-                MeanHot.append(np.mean(Hot))
-                MeanEjected.append(np.mean(Ejected))
-                MeanICS.append(np.mean(ICS))
-                MeanBH.append(np.mean(BH))
-                
-                print '  ', i, HaloRange[i], HalosFound, np.mean(BaryonFraction)
+        # Assign every central to its halo-mass bin (HaloRange[i] <= m < HaloRange[i+1]) once
+        NumBins = Nbins - 1
+        BinIndex = np.digitize(HaloMass, HaloRange) - 1
+        InRange = (BinIndex >= 0) & (BinIndex < NumBins)
+        BinIndex = BinIndex[InRange]
+
+        # Look up each central's halo totals rather than searching for its satellites
+        CentralHalo = CentralHaloID[InRange]
+        Mvir = CentralMvir[InRange]
+
+        BaryonFraction = HaloBaryons[CentralHalo] / Mvir
+        CentralHaloMass = HaloMass[InRange]
+
+        Stars = HaloStars[CentralHalo] / Mvir
+        Cold = HaloCold[CentralHalo] / Mvir
+        Hot = HaloHot[CentralHalo] / Mvir
+        Ejected = HaloEjected[CentralHalo] / Mvir
+        ICS = HaloICS[CentralHalo] / Mvir
+        BH = HaloBH[CentralHalo] / Mvir
+
+        HalosFound = np.bincount(BinIndex, minlength=NumBins)
+        BinFound = HalosFound > 2
+        Count = np.maximum(HalosFound, 1)
+
+        # One row per halo-mass bin: mean halo mass, mean and variance of the
+        # baryon fraction, then the mean fraction in each reservoir
+        BinStats = np.zeros((NumBins, 9))
+        for k, Values in ((0, CentralHaloMass), (1, BaryonFraction), (3, Stars), (4, Cold),
+                          (5, Hot), (6, Ejected), (7, ICS), (8, BH)):
+            BinStats[:, k] = np.bincount(BinIndex, weights=Values, minlength=NumBins) / Count
+        Deviation = BaryonFraction - BinStats[BinIndex, 1]
+        BinStats[:, 2] = np.bincount(BinIndex, weights=Deviation*Deviation, minlength=NumBins) / Count
+
+        for i in np.where(BinFound)[0]:
+            print '  ', i, HaloRange[i], HalosFound[i], BinStats[i, 1]
+
+        (MeanCentralHaloMass, MeanBaryonFraction, VarBaryonFraction,
+         MeanStars, MeanCold, MeanHot, MeanEjected, MeanICS, MeanBH) = BinStats[BinFound].T
+        MeanBaryonFractionU = MeanBaryonFraction + VarBaryonFraction
+        MeanBaryonFractionL = MeanBaryonFraction - VarBaryonFraction
         
         plt.plot(MeanCentralHaloMass, MeanBaryonFraction, 'k-', label='TOTAL')#, color='purple', alpha=0.3)
         plt.fill_between(MeanCentralHaloMass, MeanBaryonFractionU, MeanBaryonFractionL, 
@@ -1103,7 +1153,7 @@ class Results:
         xaxeshisto = binedges[:-1] + 0.5 * binwidth
         plt.plot(xaxeshisto, counts, 'k-', label='simulation')
 
-        plt.axis([mi, ma, 0.0, max(counts)*1.15])
+        plt.axis([mi, ma, 0.0, counts.max()*1.15])
 
         plt.ylabel(r'$\mathrm{Number}$')  # Set the y...
         plt.xlabel(r'$\mathrm{Spin\ Parameter}$')  # and the x-axis labels
@@ -1128,8 +1178,6 @@ class Results:
     
         print 'Plotting the velocity distribution of all galaxies'
     
-        seed(2222)
-    
         mi = -40.0
         ma = 40.0
         binwidth = 0.5
@@ -1198,20 +1246,35 @@ class Results:
     
         print 'Plotting the mass in stellar, cold, hot, ejected, ICS reservoirs'
     
-        seed(2222)
+        rng = np.random.RandomState(2222)
     
         plt.figure()  # New figure
         ax = plt.subplot(111)  # 1 plot on the figure
     
-        w = np.where((G.Type == 0) & (G.Mvir > 1.0) & (G.StellarMass > 0.0))[0]
-        if(len(w) > dilute): w = sample(w, dilute)
+        w = np.where(self.IsCentral(G) & (G.Mvir > 1.0) & (G.StellarMass > 0.0))[0]
+        if(len(w) > dilute): w = rng.choice(w, dilute, replace=False)
 
         mvir = np.log10(G.Mvir[w] * 1.0e10)
-        plt.scatter(mvir, np.log10(G.StellarMass[w] * 1.0e10), marker='o', s=0.3, c='k', alpha=0.5, label='Stars')
-        plt.scatter(mvir, np.log10(G.ColdGas[w] * 1.0e10), marker='o', s=0.3, color='blue', alpha=0.5, label='Cold gas')
-        plt.scatter(mvir, np.log10(G.HotGas[w] * 1.0e10), marker='o', s=0.3, color='red', alpha=0.5, label='Hot gas')
-        plt.scatter(mvir, np.log10(G.EjectedMass[w] * 1.0e10), marker='o', s=0.3, color='green', alpha=0.5, label='Ejected gas')
-        plt.scatter(mvir, np.log10(G.IntraClusterStars[w] * 1.0e10), marker='o', s=10, color='yellow', alpha=0.5, label='Intracluster stars')    
+
+        # Draw the four small-dot reservoirs as one collection with a colour per point.
+        # Scale, floor empty reservoirs at 1 Msun and take the log in place on the one buffer.
+        reservoirs = np.concatenate([G.StellarMass[w], G.ColdGas[w], G.HotGas[w], G.EjectedMass[w]])
+        reservoirs *= 1.0e10
+        np.maximum(reservoirs, 1.0, out=reservoirs)
+        np.log10(reservoirs, out=reservoirs)
+        colours = np.repeat(['k', 'blue', 'red', 'green'], len(mvir))
+        plt.scatter(np.tile(mvir, 4), reservoirs, marker='o', s=0.3, c=colours, alpha=0.5, rasterized=True)
+
+        # Empty scatters so each reservoir still gets its own legend entry
+        plt.scatter([], [], marker='o', s=0.3, c='k', alpha=0.5, label='Stars')
+        plt.scatter([], [], marker='o', s=0.3, color='blue', alpha=0.5, label='Cold gas')
+        plt.scatter([], [], marker='o', s=0.3, color='red', alpha=0.5, label='Hot gas')
+        plt.scatter([], [], marker='o', s=0.3, color='green', alpha=0.5, label='Ejected gas')
+
+        ics = G.IntraClusterStars[w] * 1.0e10
+        np.maximum(ics, 1.0, out=ics)
+        np.log10(ics, out=ics)
+        plt.scatter(mvir, ics, marker='o', s=10, color='yellow', alpha=0.5, rasterized=True, label='Intracluster stars')    
 
         plt.ylabel(r'$\mathrm{stellar,\ cold,\ hot,\ ejected,\ ICS\ mass}$')  # Set the y...
         plt.xlabel(r'$\log\ M_{\mathrm{vir}}\ (h^{-1}\ M_{\odot})$')  # and the x-axis labels
@@ -1240,12 +1303,12 @@ class Results:
     
         print 'Plotting the spatial distribution of all galaxies'
     
-        seed(2222)
+        rng = np.random.RandomState(2222)
     
         plt.figure()  # New figure
     
         w = np.where((G.Mvir > 0.0) & (G.StellarMass > 0.1))[0]
-        if(len(w) > dilute): w = sample(w, dilute)
+        if(len(w) > dilute): w = rng.choice(w, dilute, replace=False)
 
         xx = G.Pos[w,0]
         yy = G.Pos[w,1]
@@ -1254,21 +1317,21 @@ class Results:
         buff = self.BoxSize*0.1
 
         ax = plt.subplot(221)  # 1 plot on the figure
-        plt.scatter(xx, yy, marker='o', s=0.3, c='k', alpha=0.5)
+        plt.plot(xx, yy, 'ko', markersize=0.5, markeredgewidth=0, alpha=0.5, rasterized=True)
         plt.axis([0.0-buff, self.BoxSize+buff, 0.0-buff, self.BoxSize+buff])
 
         plt.ylabel(r'$\mathrm{x}$')  # Set the y...
         plt.xlabel(r'$\mathrm{y}$')  # and the x-axis labels
         
         ax = plt.subplot(222)  # 1 plot on the figure
-        plt.scatter(xx, zz, marker='o', s=0.3, c='k', alpha=0.5)
+        plt.plot(xx, zz, 'ko', markersize=0.5, markeredgewidth=0, alpha=0.5, rasterized=True)
         plt.axis([0.0-buff, self.BoxSize+buff, 0.0-buff, self.BoxSize+buff])
 
         plt.ylabel(r'$\mathrm{x}$')  # Set the y...
         plt.xlabel(r'$\mathrm{z}$')  # and the x-axis labels
         
         ax = plt.subplot(223)  # 1 plot on the figure
-        plt.scatter(yy, zz, marker='o', s=0.3, c='k', alpha=0.5)
+        plt.plot(yy, zz, 'ko', markersize=0.5, markeredgewidth=0, alpha=0.5, rasterized=True)
         plt.axis([0.0-buff, self.BoxSize+buff, 0.0-buff, self.BoxSize+buff])
         plt.ylabel(r'$\mathrm{y}$')  # Set the y...
         plt.xlabel(r'$\mathrm{z}$')  # and the x-axis labels
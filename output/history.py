@@ -6,7 +6,6 @@ matplotlib.use('Agg')
 # import h5py as h5
 import numpy as np
 import pylab as plt
-from random import sample, seed
 from os.path import getsize as getFileSize
 
 # ================================================================================
@@ -42,6 +41,112 @@ TRANSPARENT = False
 
 OutputList = []
 
+# ================================================================================
+# Observational data
+# ================================================================================
+
+# SMD observations taken from Marchesini+ 2009, h=0.7
+# Values are (minz, maxz, rho,-err,+err)
+dickenson2003 = np.array(((0.6,1.4,8.26,0.08,0.08),
+                 (1.4,2.0,7.86,0.22,0.33),
+                 (2.0,2.5,7.58,0.29,0.54),
+                 (2.5,3.0,7.52,0.51,0.48)),float)
+drory2005 = np.array(((0.25,0.75,8.3,0.15,0.15),
+            (0.75,1.25,8.16,0.15,0.15),
+            (1.25,1.75,8.0,0.16,0.16),
+            (1.75,2.25,7.85,0.2,0.2),
+            (2.25,3.0,7.75,0.2,0.2),
+            (3.0,4.0,7.58,0.2,0.2)),float)
+# Perez-Gonzalez (2008)
+pg2008 = np.array(((0.2,0.4,8.41,0.06,0.06),
+         (0.4,0.6,8.37,0.04,0.04),
+         (0.6,0.8,8.32,0.05,0.05),
+         (0.8,1.0,8.24,0.05,0.05),
+         (1.0,1.3,8.15,0.05,0.05),
+         (1.3,1.6,7.95,0.07,0.07),
+         (1.6,2.0,7.82,0.07,0.07),
+         (2.0,2.5,7.67,0.08,0.08),
+         (2.5,3.0,7.56,0.18,0.18),
+         (3.0,3.5,7.43,0.14,0.14),
+         (3.5,4.0,7.29,0.13,0.13)),float)
+glazebrook2004 = np.array(((0.8,1.1,7.98,0.14,0.1),
+                 (1.1,1.3,7.62,0.14,0.11),
+                 (1.3,1.6,7.9,0.14,0.14),
+                 (1.6,2.0,7.49,0.14,0.12)),float)
+fontana2006 = np.array(((0.4,0.6,8.26,0.03,0.03),
+              (0.6,0.8,8.17,0.02,0.02),
+              (0.8,1.0,8.09,0.03,0.03),
+              (1.0,1.3,7.98,0.02,0.02),
+              (1.3,1.6,7.87,0.05,0.05),
+              (1.6,2.0,7.74,0.04,0.04),
+              (2.0,3.0,7.48,0.04,0.04),
+              (3.0,4.0,7.07,0.15,0.11)),float)
+rudnick2006 = np.array(((0.0,1.0,8.17,0.27,0.05),
+              (1.0,1.6,7.99,0.32,0.05),
+              (1.6,2.4,7.88,0.34,0.09),
+              (2.4,3.2,7.71,0.43,0.08)),float)
+elsner2008 = np.array(((0.25,0.75,8.37,0.03,0.03),
+             (0.75,1.25,8.17,0.02,0.02),
+             (1.25,1.75,8.02,0.03,0.03),
+             (1.75,2.25,7.9,0.04,0.04),
+             (2.25,3.0,7.73,0.04,0.04),
+             (3.0,4.0,7.39,0.05,0.05)),float)
+
+SMDObs = (dickenson2003,drory2005,pg2008,glazebrook2004,
+          fontana2006,rudnick2006,elsner2008)
+
+# Marchesini et al. 2009ApJ...701.1765M SMF Schechter fits, h=0.7
+# Values are (min log mass, log Mstar, alpha, phistar, style, label)
+MarchesiniSMF = []
+for (Mmin, Mstar, alpha, phistar, style, label) in (
+        (7.0, 10.96, -1.18, 30.87*1e-4, ':', 'Marchesini et al. 2009 z=[0.1]'),
+        (9.3, 10.91, -0.99, 10.17*1e-4, 'b:', '... z=[1.3,2.0]'),
+        (9.7, 10.96, -1.01, 3.95*1e-4, 'g:', '... z=[2.0,3.0]'),
+        (10.0, 11.38, -1.39, 0.53*1e-4, 'r:', '... z=[3.0,4.0]')):
+    M = np.arange(Mmin, 11.8, 0.01)
+    xval = 10.0 ** (M-Mstar)
+    yval = np.log(10.) * phistar * xval ** (alpha+1) * np.exp(-xval)
+    MarchesiniSMF.append((M, yval, style, label))
+
+# SFR density compilation used in Croton et al. 2006
+ObsSFRdensity = np.array([
+    [0, 0.0158489, 0, 0, 0.0251189, 0.01000000],
+    [0.150000, 0.0173780, 0, 0.300000, 0.0181970, 0.0165959],
+    [0.0425000, 0.0239883, 0.0425000, 0.0425000, 0.0269153, 0.0213796],
+    [0.200000, 0.0295121, 0.100000, 0.300000, 0.0323594, 0.0269154],
+    [0.350000, 0.0147911, 0.200000, 0.500000, 0.0173780, 0.0125893],
+    [0.625000, 0.0275423, 0.500000, 0.750000, 0.0331131, 0.0229087],
+    [0.825000, 0.0549541, 0.750000, 1.00000, 0.0776247, 0.0389045],
+    [0.625000, 0.0794328, 0.500000, 0.750000, 0.0954993, 0.0660693],
+    [0.700000, 0.0323594, 0.575000, 0.825000, 0.0371535, 0.0281838],
+    [1.25000, 0.0467735, 1.50000, 1.00000, 0.0660693, 0.0331131],
+    [0.750000, 0.0549541, 0.500000, 1.00000, 0.0389045, 0.0776247],
+    [1.25000, 0.0741310, 1.00000, 1.50000, 0.0524807, 0.104713],
+    [1.75000, 0.0562341, 1.50000, 2.00000, 0.0398107, 0.0794328],
+    [2.75000, 0.0794328, 2.00000, 3.50000, 0.0562341, 0.112202],
+    [4.00000, 0.0309030, 3.50000, 4.50000, 0.0489779, 0.0194984],
+    [0.250000, 0.0398107, 0.00000, 0.500000, 0.0239883, 0.0812831],
+    [0.750000, 0.0446684, 0.500000, 1.00000, 0.0323594, 0.0776247],
+    [1.25000, 0.0630957, 1.00000, 1.50000, 0.0478630, 0.109648],
+    [1.75000, 0.0645654, 1.50000, 2.00000, 0.0489779, 0.112202],
+    [2.50000, 0.0831764, 2.00000, 3.00000, 0.0512861, 0.158489],
+    [3.50000, 0.0776247, 3.00000, 4.00000, 0.0416869, 0.169824],
+    [4.50000, 0.0977237, 4.00000, 5.00000, 0.0416869, 0.269153],
+    [5.50000, 0.0426580, 5.00000, 6.00000, 0.0177828, 0.165959],
+    [3.00000, 0.120226, 2.00000, 4.00000, 0.173780, 0.0831764],
+    [3.04000, 0.128825, 2.69000, 3.39000, 0.151356, 0.109648],
+    [4.13000, 0.114815, 3.78000, 4.48000, 0.144544, 0.0912011],
+    [0.350000, 0.0346737, 0.200000, 0.500000, 0.0537032, 0.0165959],
+    [0.750000, 0.0512861, 0.500000, 1.00000, 0.0575440, 0.0436516],
+    [1.50000, 0.0691831, 1.00000, 2.00000, 0.0758578, 0.0630957],
+    [2.50000, 0.147911, 2.00000, 3.00000, 0.169824, 0.128825],
+    [3.50000, 0.0645654, 3.00000, 4.00000, 0.0776247, 0.0512861],
+    ], dtype=np.float32)
+ObsSFRRedshift = ObsSFRdensity[:, 0]
+ObsSFRxErr = [ObsSFRdensity[:, 0]-ObsSFRdensity[:, 2], ObsSFRdensity[:, 3]-ObsSFRdensity[:, 0]]
+ObsSFR = np.log10(ObsSFRdensity[:, 1])
+ObsSFRyErr = [ObsSFR-np.log10(ObsSFRdensity[:, 4]), np.log10(ObsSFRdensity[:, 5])-ObsSFR]
+
 
 class Results:
 
@@ -195,10 +300,10 @@ class Results:
                 FileIndexRanges.append((offset,offset+NtotGals))
         
                 # Slice the file array into the global array
-                # N.B. the copy() part is required otherwise we simply point to
-                # the GG data which changes from file to file
+                # N.B. slice assignment copies the records into G, so GG can be
+                # reused for the next file without an extra copy()
                 # NOTE THE WAY PYTHON WORKS WITH THESE INDICES!
-                G[offset:offset+NtotGals]=GG[0:NtotGals].copy()
+                G[offset:offset+NtotGals]=GG[0:NtotGals]
             
                 del(GG)
                 offset = offset + NtotGals  # Update the offset position for the global array
@@ -229,120 +334,36 @@ class Results:
 
         binwidth = 0.1  # mass function histogram bin width
 
-        # Marchesini et al. 2009ApJ...701.1765M SMF, h=0.7
-        M = np.arange(7.0, 11.8, 0.01)
-        Mstar = np.log10(10.0**10.96)
-        alpha = -1.18
-        phistar = 30.87*1e-4
-        xval = 10.0 ** (M-Mstar)
-        yval = np.log(10.) * phistar * xval ** (alpha+1) * np.exp(-xval)
-        if(whichimf == 0):
-            plt.plot(np.log10(10.0**M *1.6), yval, ':', lw=10, alpha=0.5, label='Marchesini et al. 2009 z=[0.1]')
-        elif(whichimf == 1):
-            plt.plot(np.log10(10.0**M *1.6 /1.8), yval, ':', lw=10, alpha=0.5, label='Marchesini et al. 2009 z=[0.1]')
-            
-
-        M = np.arange(9.3, 11.8, 0.01)
-        Mstar = np.log10(10.0**10.91)
-        alpha = -0.99
-        phistar = 10.17*1e-4
-        xval = 10.0 ** (M-Mstar)
-        yval = np.log(10.) * phistar * xval ** (alpha+1) * np.exp(-xval)
-        if(whichimf == 0):
-            plt.plot(np.log10(10.0**M *1.6), yval, 'b:', lw=10, alpha=0.5, label='... z=[1.3,2.0]')
-        elif(whichimf == 1):
-            plt.plot(np.log10(10.0**M *1.6/1.8), yval, 'b:', lw=10, alpha=0.5, label='... z=[1.3,2.0]')
-
-        M = np.arange(9.7, 11.8, 0.01)
-        Mstar = np.log10(10.0**10.96)
-        alpha = -1.01
-        phistar = 3.95*1e-4
-        xval = 10.0 ** (M-Mstar)
-        yval = np.log(10.) * phistar * xval ** (alpha+1) * np.exp(-xval)
-        if(whichimf == 0):
-            plt.plot(np.log10(10.0**M *1.6), yval, 'g:', lw=10, alpha=0.5, label='... z=[2.0,3.0]')
-        elif(whichimf == 1):
-            plt.plot(np.log10(10.0**M *1.6/1.8), yval, 'g:', lw=10, alpha=0.5, label='... z=[2.0,3.0]')
-
-        M = np.arange(10.0, 11.8, 0.01)
-        Mstar = np.log10(10.0**11.38)
-        alpha = -1.39
-        phistar = 0.53*1e-4
-        xval = 10.0 ** (M-Mstar)
-        yval = np.log(10.) * phistar * xval ** (alpha+1) * np.exp(-xval)
+        # Marchesini et al. 2009 SMFs, shifted to our IMF in log mass
         if(whichimf == 0):
-            plt.plot(np.log10(10.0**M *1.6), yval, 'r:', lw=10, alpha=0.5, label='... z=[3.0,4.0]')
+            IMFoffset = np.log10(1.6)
         elif(whichimf == 1):
-            plt.plot(np.log10(10.0**M *1.6/1.8), yval, 'r:', lw=10, alpha=0.5, label='... z=[3.0,4.0]')
-
-
-        ###### z=0
-        
-        w = np.where(G_history[self.SMFsnaps[0]].StellarMass > 0.0)[0]
-        mass = np.log10(G_history[self.SMFsnaps[0]].StellarMass[w] * 1.0e10 /self.Hubble_h)
-
-        mi = np.floor(min(mass)) - 2
-        ma = np.floor(max(mass)) + 2
-        NB = int((ma - mi) / binwidth)
-
-        (counts, binedges) = np.histogram(mass, range=(mi, ma), bins=NB)
-
-        # Set the x-axis values to be the centre of the bins
-        xaxeshisto = binedges[:-1] + 0.5 * binwidth
+            IMFoffset = np.log10(1.6/1.8)
 
-        # Overplot the model histograms
-        plt.plot(xaxeshisto, counts / self.volume *self.Hubble_h*self.Hubble_h*self.Hubble_h / binwidth, 'k-', label='Model galaxies')
+        for (M, yval, style, label) in MarchesiniSMF:
+            plt.plot(M + IMFoffset, yval, style, lw=10, alpha=0.5, label=label)
 
-        ###### z=1.3
-        
-        w = np.where(G_history[self.SMFsnaps[1]].StellarMass > 0.0)[0]
-        mass = np.log10(G_history[self.SMFsnaps[1]].StellarMass[w] * 1.0e10 /self.Hubble_h)
-
-        mi = np.floor(min(mass)) - 2
-        ma = np.floor(max(mass)) + 2
-        NB = int((ma - mi) / binwidth)
-
-        (counts, binedges) = np.histogram(mass, range=(mi, ma), bins=NB)
-
-        # Set the x-axis values to be the centre of the bins
-        xaxeshisto = binedges[:-1] + 0.5 * binwidth
-
-        # Overplot the model histograms
-        plt.plot(xaxeshisto, counts / self.volume *self.Hubble_h*self.Hubble_h*self.Hubble_h / binwidth, 'b-')
-
-        ###### z=2
-        
-        w = np.where(G_history[self.SMFsnaps[2]].StellarMass > 0.0)[0]
-        mass = np.log10(G_history[self.SMFsnaps[2]].StellarMass[w] * 1.0e10 /self.Hubble_h)
-
-        mi = np.floor(min(mass)) - 2
-        ma = np.floor(max(mass)) + 2
-        NB = int((ma - mi) / binwidth)
-
-        (counts, binedges) = np.histogram(mass, range=(mi, ma), bins=NB)
+        # Model stellar mass functions at z=0, 1.3, 2 and 3
+        norm = self.Hubble_h*self.Hubble_h*self.Hubble_h / (self.volume * binwidth)  # counts -> Mpc^-3 dex^-1
+        for (snap, style, label) in zip(self.SMFsnaps, ('k-', 'b-', 'g-', 'r-'), ('Model galaxies', '_nolegend_', '_nolegend_', '_nolegend_')):
 
-        # Set the x-axis values to be the centre of the bins
-        xaxeshisto = binedges[:-1] + 0.5 * binwidth
+            StellarMass = G_history[snap].StellarMass
+            mass = np.log10(StellarMass[StellarMass > 0.0] * 1.0e10 /self.Hubble_h)
 
-        # Overplot the model histograms
-        plt.plot(xaxeshisto, counts / self.volume *self.Hubble_h*self.Hubble_h*self.Hubble_h / binwidth, 'g-')
+            mi = np.floor(mass.min()) - 2
+            ma = np.floor(mass.max()) + 2
+            NB = int((ma - mi) / binwidth)
 
-        ###### z=3
-        
-        w = np.where(G_history[self.SMFsnaps[3]].StellarMass > 0.0)[0]
-        mass = np.log10(G_history[self.SMFsnaps[3]].StellarMass[w] * 1.0e10 /self.Hubble_h)
-
-        mi = np.floor(min(mass)) - 2
-        ma = np.floor(max(mass)) + 2
-        NB = int((ma - mi) / binwidth)
-
-        (counts, binedges) = np.histogram(mass, range=(mi, ma), bins=NB)
+            # The bins are uniform and cover every galaxy, so count them
+            # straight from each galaxy's bin index
+            BinIndex = np.minimum(((mass - mi) / binwidth).astype(np.intp), NB - 1)
+            counts = np.bincount(BinIndex, minlength=NB)
 
-        # Set the x-axis values to be the centre of the bins
-        xaxeshisto = binedges[:-1] + 0.5 * binwidth
+            # Set the x-axis values to be the centre of the bins
+            xaxeshisto = mi + (np.arange(NB) + 0.5) * binwidth
 
-        # Overplot the model histograms
-        plt.plot(xaxeshisto, counts / self.volume *self.Hubble_h*self.Hubble_h*self.Hubble_h / binwidth, 'r-')
+            # Overplot the model histograms
+            plt.plot(xaxeshisto, counts * norm, style, label=label)
 
         ######        
 
@@ -381,54 +402,12 @@ class Results:
         plt.figure()  # New figure
         ax = plt.subplot(111)  # 1 plot on the figure
 
-        ObsSFRdensity = np.array([
-            [0, 0.0158489, 0, 0, 0.0251189, 0.01000000],
-            [0.150000, 0.0173780, 0, 0.300000, 0.0181970, 0.0165959],
-            [0.0425000, 0.0239883, 0.0425000, 0.0425000, 0.0269153, 0.0213796],
-            [0.200000, 0.0295121, 0.100000, 0.300000, 0.0323594, 0.0269154],
-            [0.350000, 0.0147911, 0.200000, 0.500000, 0.0173780, 0.0125893],
-            [0.625000, 0.0275423, 0.500000, 0.750000, 0.0331131, 0.0229087],
-            [0.825000, 0.0549541, 0.750000, 1.00000, 0.0776247, 0.0389045],
-            [0.625000, 0.0794328, 0.500000, 0.750000, 0.0954993, 0.0660693],
-            [0.700000, 0.0323594, 0.575000, 0.825000, 0.0371535, 0.0281838],
-            [1.25000, 0.0467735, 1.50000, 1.00000, 0.0660693, 0.0331131],
-            [0.750000, 0.0549541, 0.500000, 1.00000, 0.0389045, 0.0776247],
-            [1.25000, 0.0741310, 1.00000, 1.50000, 0.0524807, 0.104713],
-            [1.75000, 0.0562341, 1.50000, 2.00000, 0.0398107, 0.0794328],
-            [2.75000, 0.0794328, 2.00000, 3.50000, 0.0562341, 0.112202],
-            [4.00000, 0.0309030, 3.50000, 4.50000, 0.0489779, 0.0194984],
-            [0.250000, 0.0398107, 0.00000, 0.500000, 0.0239883, 0.0812831],
-            [0.750000, 0.0446684, 0.500000, 1.00000, 0.0323594, 0.0776247],
-            [1.25000, 0.0630957, 1.00000, 1.50000, 0.0478630, 0.109648],
-            [1.75000, 0.0645654, 1.50000, 2.00000, 0.0489779, 0.112202],
-            [2.50000, 0.0831764, 2.00000, 3.00000, 0.0512861, 0.158489],
-            [3.50000, 0.0776247, 3.00000, 4.00000, 0.0416869, 0.169824],
-            [4.50000, 0.0977237, 4.00000, 5.00000, 0.0416869, 0.269153],
-            [5.50000, 0.0426580, 5.00000, 6.00000, 0.0177828, 0.165959],
-            [3.00000, 0.120226, 2.00000, 4.00000, 0.173780, 0.0831764],
-            [3.04000, 0.128825, 2.69000, 3.39000, 0.151356, 0.109648],
-            [4.13000, 0.114815, 3.78000, 4.48000, 0.144544, 0.0912011],
-            [0.350000, 0.0346737, 0.200000, 0.500000, 0.0537032, 0.0165959],
-            [0.750000, 0.0512861, 0.500000, 1.00000, 0.0575440, 0.0436516],
-            [1.50000, 0.0691831, 1.00000, 2.00000, 0.0758578, 0.0630957],
-            [2.50000, 0.147911, 2.00000, 3.00000, 0.169824, 0.128825],
-            [3.50000, 0.0645654, 3.00000, 4.00000, 0.0776247, 0.0512861],
-            ], dtype=np.float32)
- 
-        ObsRedshift = ObsSFRdensity[:, 0]
-        xErrLo = ObsSFRdensity[:, 0]-ObsSFRdensity[:, 2]
-        xErrHi = ObsSFRdensity[:, 3]-ObsSFRdensity[:, 0]
-
-        ObsSFR = np.log10(ObsSFRdensity[:, 1])
-        yErrLo = np.log10(ObsSFRdensity[:, 1])-np.log10(ObsSFRdensity[:, 4])
-        yErrHi = np.log10(ObsSFRdensity[:, 5])-np.log10(ObsSFRdensity[:, 1])
-
         # plot observational data (compilation used in Croton et al. 2006)
-        plt.errorbar(ObsRedshift, ObsSFR, yerr=[yErrLo, yErrHi], xerr=[xErrLo, xErrHi], color='g', lw=1.0, alpha=0.3, marker='o', ls='none', label='Observations')
+        plt.errorbar(ObsSFRRedshift, ObsSFR, yerr=ObsSFRyErr, xerr=ObsSFRxErr, color='g', lw=1.0, alpha=0.3, marker='o', ls='none', label='Observations')
 
         SFR_density = np.zeros((LastSnap+1-FirstSnap))       
         for snap in xrange(FirstSnap,LastSnap+1):
-          SFR_density[snap-FirstSnap] = sum(G_history[snap].SfrDisk+G_history[snap].SfrBulge) / self.volume * self.Hubble_h*self.Hubble_h*self.Hubble_h
+          SFR_density[snap-FirstSnap] = (G_history[snap].SfrDisk.sum(dtype=np.float64) + G_history[snap].SfrBulge.sum(dtype=np.float64)) / self.volume * self.Hubble_h*self.Hubble_h*self.Hubble_h
     
         z = np.array(self.redshift)
         nonzero = np.where(SFR_density > 0.0)[0]
@@ -461,70 +440,27 @@ class Results:
         plt.figure()  # New figure
         ax = plt.subplot(111)  # 1 plot on the figure
 
-        # SMD observations taken from Marchesini+ 2009, h=0.7
-        # Values are (minz, maxz, rho,-err,+err)
-        dickenson2003 = np.array(((0.6,1.4,8.26,0.08,0.08),
-                         (1.4,2.0,7.86,0.22,0.33),
-                         (2.0,2.5,7.58,0.29,0.54),
-                         (2.5,3.0,7.52,0.51,0.48)),float)
-        drory2005 = np.array(((0.25,0.75,8.3,0.15,0.15),
-                    (0.75,1.25,8.16,0.15,0.15),
-                    (1.25,1.75,8.0,0.16,0.16),
-                    (1.75,2.25,7.85,0.2,0.2),
-                    (2.25,3.0,7.75,0.2,0.2),
-                    (3.0,4.0,7.58,0.2,0.2)),float)
-        # Perez-Gonzalez (2008)
-        pg2008 = np.array(((0.2,0.4,8.41,0.06,0.06),
-                 (0.4,0.6,8.37,0.04,0.04),
-                 (0.6,0.8,8.32,0.05,0.05),
-                 (0.8,1.0,8.24,0.05,0.05),
-                 (1.0,1.3,8.15,0.05,0.05),
-                 (1.3,1.6,7.95,0.07,0.07),
-                 (1.6,2.0,7.82,0.07,0.07),
-                 (2.0,2.5,7.67,0.08,0.08),
-                 (2.5,3.0,7.56,0.18,0.18),
-                 (3.0,3.5,7.43,0.14,0.14),
-                 (3.5,4.0,7.29,0.13,0.13)),float)
-        glazebrook2004 = np.array(((0.8,1.1,7.98,0.14,0.1),
-                         (1.1,1.3,7.62,0.14,0.11),
-                         (1.3,1.6,7.9,0.14,0.14),
-                         (1.6,2.0,7.49,0.14,0.12)),float)
-        fontana2006 = np.array(((0.4,0.6,8.26,0.03,0.03),
-                      (0.6,0.8,8.17,0.02,0.02),
-                      (0.8,1.0,8.09,0.03,0.03),
-                      (1.0,1.3,7.98,0.02,0.02),
-                      (1.3,1.6,7.87,0.05,0.05),
-                      (1.6,2.0,7.74,0.04,0.04),
-                      (2.0,3.0,7.48,0.04,0.04),
-                      (3.0,4.0,7.07,0.15,0.11)),float)
-        rudnick2006 = np.array(((0.0,1.0,8.17,0.27,0.05),
-                      (1.0,1.6,7.99,0.32,0.05),
-                      (1.6,2.4,7.88,0.34,0.09),
-                      (2.4,3.2,7.71,0.43,0.08)),float)
-        elsner2008 = np.array(((0.25,0.75,8.37,0.03,0.03),
-                     (0.75,1.25,8.17,0.02,0.02),
-                     (1.25,1.75,8.02,0.03,0.03),
-                     (1.75,2.25,7.9,0.04,0.04),
-                     (2.25,3.0,7.73,0.04,0.04),
-                     (3.0,4.0,7.39,0.05,0.05)),float)
-
-        obs = (dickenson2003,drory2005,pg2008,glazebrook2004,
-               fontana2006,rudnick2006,elsner2008)
-
-        for o in obs:
+        # Convert the observations to our IMF with a constant shift in log space
+        if(whichimf == 0):
+            IMFoffset = np.log10(1.6)
+        elif(whichimf == 1):
+            IMFoffset = np.log10(1.6/1.8)
+
+        for o in SMDObs:
             xval = ((o[:,1]-o[:,0])/2.)+o[:,0]
-            if(whichimf == 0):
-                ax.errorbar(xval, np.log10(10**o[:,2] *1.6), xerr=(xval-o[:,0], o[:,1]-xval), yerr=(o[:,3], o[:,4]), alpha=0.3, lw=1.0, marker='o', ls='none')
-            elif(whichimf == 1):
-                ax.errorbar(xval, np.log10(10**o[:,2] *1.6/1.8), xerr=(xval-o[:,0], o[:,1]-xval), yerr=(o[:,3], o[:,4]), alpha=0.3, lw=1.0, marker='o', ls='none')
-                
+            ax.errorbar(xval, o[:,2] + IMFoffset, xerr=(xval-o[:,0], o[:,1]-xval), yerr=(o[:,3], o[:,4]), alpha=0.3, lw=1.0, marker='o', ls='none')
 
         smd = np.zeros((LastSnap+1-FirstSnap))       
 
+        # Mass limits in code units (1e10 Msun/h), so no per-galaxy division
+        lo = 0.01 * self.Hubble_h
+        hi = 1000.0 * self.Hubble_h
+
         for snap in xrange(FirstSnap,LastSnap+1):
-          w = np.where((G_history[snap].StellarMass/self.Hubble_h > 0.01) & (G_history[snap].StellarMass/self.Hubble_h < 1000.0))[0]
-          if(len(w) > 0):
-            smd[snap-FirstSnap] = sum(G_history[snap].StellarMass[w]) *1.0e10/self.Hubble_h / (self.volume /self.Hubble_h/self.Hubble_h/self.Hubble_h)
+          sm = G_history[snap].StellarMass
+          mask = (sm > lo) & (sm < hi)
+          if(mask.any()):
+            smd[snap-FirstSnap] = sm[mask].sum(dtype=np.float64) *1.0e10/self.Hubble_h / (self.volume /self.Hubble_h/self.Hubble_h/self.Hubble_h)
 
         z = np.array(self.redshift)
         nonzero = np.where(smd > 0.0)[0]